@@ -1,8 +1,14 @@
 import requests
 import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
+import orjson
 import streamlit as st
 import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 
 logging.basicConfig(
@@ -14,47 +20,104 @@ logging.basicConfig(
 
 API = "http://0.0.0.0:8000"
 ALL_VISITS = "/api/visits/all"
+VISITS_PAGE_SIZE = 100
+VISITS_PAGE = (lambda page: f"{ALL_VISITS}?limit={VISITS_PAGE_SIZE}&offset={page * VISITS_PAGE_SIZE}")
+VISITS_COLUMNS = ["id", "stand_id", "gender", "age_group", "age", "timestamp", "time_elapsed"]
 STANDS_NAMES = "/api/stands/names"
-STAND_DATES = (lambda stand_id: f"/api/stands/{stand_id}/dates")
-STAND_DATE_RANGES = (lambda stand_id: f"/api/stands/{stand_id}/date_range")
 STAND_STATS = (lambda stand_id: f"/api/stands/{stand_id}/stats")
+STAND_BUNDLE = (lambda stand_id: f"/api/stands/{stand_id}/bundle")
 
 
-class Shared:
-    """Shared application state for Streamlit dashboard."""
+@st.cache_resource
+def get_session() -> requests.Session:
+    """Return the keep-alive session shared by all API calls across reruns."""
 
-    stands: list = []
-    dates_from_stand: pd.Series = pd.Series()
-    date_range: tuple = ()
-    stats: dict = {}
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=10,
+        max_retries=Retry(total=3, backoff_factor=0.1)
+    ))
+    return session
+
+
+@st.cache_resource
+def get_executor() -> ThreadPoolExecutor:
+    """Return the worker pool for issuing independent API calls concurrently."""
+
+    return ThreadPoolExecutor(max_workers=4)
 
 
-@st.cache_data(ttl=60)
 def get_data(api_val):
-    """Fetch JSON data from API endpoint with caching and error handling."""
+    """Fetch JSON data from API endpoint with error handling."""
 
     try:
-        response = requests.get(f"{API}{api_val}")
+        response = get_session().get(f"{API}{api_val}")
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(response.content)
     except Exception as err:
         st.error(f"API error: {err}")
         return []
 
 
+@st.cache_data(ttl=60)
+def get_data_short(api_val):
+    """Fetch JSON data for frequently changing endpoints (visits, stats)."""
+
+    return get_data(api_val)
+
+
+@st.cache_data(ttl=24 * 60 * 60)
+def get_data_long(api_val):
+    """Fetch JSON data for rarely changing endpoints (stand names)."""
+
+    return get_data(api_val)
+
+
+@st.cache_data(ttl=60)
+def visits_df(pages: int) -> pd.DataFrame:
+    """Build the visits table from the first pages of the API, cached between reruns."""
+
+    all_visits = []
+    for page in range(pages):
+        all_visits.extend(get_data_short(VISITS_PAGE(page)))
+
+    df = pd.DataFrame.from_records(all_visits, columns=VISITS_COLUMNS)
+    return df.astype({"gender": "category", "age_group": "category", "age": "float32"})
+
+
+def parse_timestamps(dates_data) -> pd.DatetimeIndex:
+    """Parse visit timestamps from the API in a single vectorized call."""
+
+    return pd.to_datetime([obj["timestamp"] for obj in dates_data], format="ISO8601", cache=True)
+
+
+def submit(fn, *args) -> Future:
+    """Run fn(*args) on the worker pool, keeping the Streamlit script context."""
+
+    ctx = get_script_run_ctx()
+
+    def run():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+
+    return get_executor().submit(run)
+
+
+@st.cache_data(ttl=60)
 def get_stand_stats(stand_name, start_date, end_date):
     """Get visit statistics for a stand within date range."""
 
     try:
-        response = requests.get(
+        response = get_session().get(
             API + STAND_STATS(stand_name),
             params={
-                "start_date": start_date.strftime("%Y-%m-%d"),
-                "end_date": end_date.strftime("%Y-%m-%d")
+                "start_date": start_date.date().isoformat(),
+                "end_date": end_date.date().isoformat()
             }
         )
         if response.status_code == 200:
-            return response.json()
+            return orjson.loads(response.content)
         return {}
     except Exception as err:
         st.error(f"Stats error: {err}")
@@ -71,19 +134,21 @@ def stand_callback():
     print(f"Selected stand: {selected_stand}")
     
     with st.spinner("Loading dates..."):
-        dates_data = get_data(STAND_DATES(selected_stand))
-        Shared.dates_from_stand = pd.to_datetime([obj["timestamp"] for obj in dates_data])
+        bundle = get_data_short(STAND_BUNDLE(selected_stand)) or {}
+        dates_data = bundle.get("dates", [])
+        dates_from_stand = parse_timestamps(dates_data)
+        st.session_state.dates_from_stand = dates_from_stand
         
-        if len(Shared.dates_from_stand) > 0:
-            Shared.date_range = (
-                Shared.dates_from_stand.min().to_pydatetime(), 
-                Shared.dates_from_stand.max().to_pydatetime()
+        if len(dates_from_stand) > 0:
+            st.session_state.date_range = (
+                dates_from_stand.min().to_pydatetime(), 
+                dates_from_stand.max().to_pydatetime()
             )
             st.session_state.date_slider = (
-                Shared.dates_from_stand[0], 
-                Shared.dates_from_stand[-1]
+                dates_from_stand[0], 
+                dates_from_stand[-1]
             )
-            Shared.stats = get_stand_stats(selected_stand, Shared.date_range[0], Shared.date_range[1])
+            st.session_state.stats = bundle.get("stats", {})
 
 
 def date_callback():
@@ -97,70 +162,90 @@ def date_callback():
     end_time = st.session_state.date_slider[0]
     print(f"Date range: {start_time} to {end_time}")
     
-    Shared.stats = get_stand_stats(selected_stand, start_time, end_time)
+    st.session_state.stats = get_stand_stats(selected_stand, start_time, end_time)
 
 
 def main():
     st.set_page_config(page_title="Museum dashboard", layout="wide")
 
-    if not Shared.stands:
+    # Per-session state; API responses themselves are shared through st.cache_data
+    if "stands" not in st.session_state:
+        st.session_state.dates_from_stand = pd.DatetimeIndex([])
+        st.session_state.date_range = ()
+        st.session_state.stats = {}
+
         with st.spinner("Loading initial data..."):
-            get_data(ALL_VISITS)
-            stands_data = get_data(STANDS_NAMES)
-            Shared.stands = [obj["name"] for obj in stands_data]
+            visits_future = submit(get_data_short, VISITS_PAGE(0))
+            stands_data = submit(get_data_long, STANDS_NAMES).result()
+            if not stands_data:
+                # Don't keep a failed or empty response cached for the whole day
+                get_data_long.clear()
+            st.session_state.stands = [obj["name"] for obj in stands_data]
             
-            if Shared.stands:
-                first_stand = Shared.stands[0]
-                dates_data = get_data(STAND_DATES(first_stand))
-                Shared.dates_from_stand = pd.to_datetime([obj["timestamp"] for obj in dates_data])
+            if st.session_state.stands:
+                first_stand = st.session_state.stands[0]
+                bundle = get_data_short(STAND_BUNDLE(first_stand)) or {}
+                dates_data = bundle.get("dates", [])
+                dates_from_stand = parse_timestamps(dates_data)
+                st.session_state.dates_from_stand = dates_from_stand
                 
-                if len(Shared.dates_from_stand) > 0:
-                    Shared.date_range = (
-                        Shared.dates_from_stand.min().to_pydatetime(), 
-                        Shared.dates_from_stand.max().to_pydatetime()
+                if len(dates_from_stand) > 0:
+                    st.session_state.date_range = (
+                        dates_from_stand.min().to_pydatetime(), 
+                        dates_from_stand.max().to_pydatetime()
                     )
-                    Shared.stats = get_stand_stats(first_stand, Shared.date_range[0], Shared.date_range[1])
+                    st.session_state.stats = bundle.get("stats", {})
+
+            # Warm the visits cache before it is read below
+            visits_future.result()
 
-    if not Shared.stands:
+    stands = st.session_state.stands
+    dates_from_stand = st.session_state.dates_from_stand
+
+    with st.sidebar:
+        st.header("Menu")
+
+        if st.button("Refresh data"):
+            st.cache_data.clear()
+            for key in ("stands", "stand_select", "date_slider"):
+                st.session_state.pop(key, None)
+            st.rerun()
+
+    if not stands:
+        del st.session_state.stands
         st.error("Stands not found")
         st.stop()
 
     st.title("Museum stats")
     st.markdown("---")
 
-    if "stand_select" not in st.session_state and Shared.stands:
-        st.session_state.stand_select = Shared.stands[0]
+    if "stand_select" not in st.session_state and stands:
+        st.session_state.stand_select = stands[0]
     
     if ("date_slider" not in st.session_state or 
-        len(Shared.dates_from_stand) == 0 or 
-        st.session_state.date_slider[0] not in Shared.dates_from_stand):
+        len(dates_from_stand) == 0 or 
+        st.session_state.date_slider[0] not in dates_from_stand):
         
-        if len(Shared.dates_from_stand) > 1:
+        if len(dates_from_stand) > 1:
             st.session_state.date_slider = (
-                Shared.dates_from_stand[0], 
-                Shared.dates_from_stand[-1]
+                dates_from_stand[0], 
+                dates_from_stand[-1]
             )
 
     with st.sidebar:
-        st.header("Menu")
-        
-        if st.button("Refresh data"):
-            st.cache_data.clear()
-            st.rerun()
-
-        current_stand_index = Shared.stands.index(st.session_state.stand_select) if Shared.stands else 0
+        current_stand_index = stands.index(st.session_state.stand_select) if stands else 0
         st.selectbox(
             "Stand", 
-            options=Shared.stands, 
+            options=stands, 
             key="stand_select", 
             index=current_stand_index,
             on_change=stand_callback
         )
 
-        if len(Shared.dates_from_stand) > 1:
+        if len(dates_from_stand) > 1:
             start_time, end_time = st.select_slider(
                 "Date range",
-                options=Shared.dates_from_stand,
+                options=dates_from_stand,
                 key="date_slider",
                 value=st.session_state.date_slider,
                 on_change=date_callback,
@@ -171,7 +256,7 @@ def main():
     st.header("Key statistics")
     cols = st.columns(5)
     
-    stats = Shared.stats or {}
+    stats = st.session_state.stats or {}
     default_stats = {
         "avg_age": 0, "avg_time_elapsed": 0, "total_visits": 0,
         "most_common_gender": "N/A", "most_common_age_group": "N/A"
@@ -189,9 +274,16 @@ def main():
     with cols[4]:
         st.metric("Age Group", stats["most_common_age_group"])
 
-    all_visits = get_data(ALL_VISITS)
-    if all_visits:
-        st.dataframe(pd.DataFrame(all_visits))
+    # Visits are loaded page by page, more pages are fetched on demand
+    st.session_state.setdefault("visits_pages", 1)
+    visits = visits_df(st.session_state.visits_pages)
+
+    if not visits.empty:
+        st.dataframe(visits)
+        if len(visits) >= st.session_state.visits_pages * VISITS_PAGE_SIZE:
+            if st.button("Load more"):
+                st.session_state.visits_pages += 1
+                st.rerun()
     else:
         st.info("Нет данных о посещениях")
 
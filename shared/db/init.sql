@@ -24,3 +24,9 @@ CREATE TABLE IF NOT EXISTS visits (
 
   FOREIGN KEY (stand_id) REFERENCES stands(id)
 );
+
+CREATE INDEX IF NOT EXISTS idx_visits_stand_ts ON visits(stand_id, timestamp);
+-- Ascending (timestamp, id) so the newest-first keyset pages scan it backwards
+DROP INDEX IF EXISTS idx_visits_timestamp;
+CREATE INDEX IF NOT EXISTS idx_visits_timestamp_id ON visits(timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_stands_id_name ON stands(id DESC, name);
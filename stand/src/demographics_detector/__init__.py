@@ -1,4 +1,3 @@
-from .detector import DemographicsEstimator
-
-__all__ = ["DemographicsEstimator"]
+from .detector import DemographicsEstimator, AGE_LIST, AGE_BUCKETS, AGE_MIDPOINTS
 
+__all__ = ["DemographicsEstimator", "AGE_LIST", "AGE_BUCKETS", "AGE_MIDPOINTS"]
@@ -1,6 +1,12 @@
 from pathlib import Path
 
 import cv2
+import numpy as np
+
+try:
+    import onnxruntime as ort
+except ImportError:  # optional accelerated backend, see the "onnx" extra
+    ort = None
 
 
 FACE_PROTO = Path("../shared/demographics/opencv_face_detector.pbtxt").resolve().absolute()
@@ -10,13 +16,56 @@ AGE_MODEL = Path("../shared/demographics/age_net.caffemodel").resolve().absolute
 GENDER_PROTO = Path("../shared/demographics/gender_deploy.prototxt").resolve().absolute()
 GENDER_MODEL = Path("../shared/demographics/gender_net.caffemodel").resolve().absolute()
 
+# Optional INT8 OpenVINO IR versions of the models (.xml + .bin), used when present
+FACE_IR = Path("../shared/demographics/openvino/face_int8.xml").resolve().absolute()
+AGE_IR = Path("../shared/demographics/openvino/age_int8.xml").resolve().absolute()
+GENDER_IR = Path("../shared/demographics/openvino/gender_int8.xml").resolve().absolute()
+
+# Optional ONNX exports of the age/gender nets, used through ONNX Runtime when present
+AGE_ONNX = Path("../shared/demographics/age_net.onnx").resolve().absolute()
+GENDER_ONNX = Path("../shared/demographics/gender_net.onnx").resolve().absolute()
+
 AGE_LIST = ['0-2', '4-6', '8-12', '15-20',
             '21-24', '25-32', '33-43', '44-53', '60-100'] 
 GENDER_LIST = ['Male', 'Female', "Unknown"]
 
+
+def _age_bucket(lo):
+    """
+    Map the lower bound of an age range into a coarse age bucket.
+
+    Args:
+        lo (int): Lower bound of a range from AGE_LIST, e.g. 25 for "25-32".
+
+    Returns:
+        str: One of "child", "young", "adult", "senior".
+    """
+
+    if lo < 18:
+        return "child"
+    elif 18 <= lo < 30:
+        return "young"
+    elif 40 <= lo <= 60:
+        return "adult"
+    else:
+        return "senior"
+
+
+# Lookups aligned with AGE_LIST, built once so predictions are decoded by index
+AGE_LO = tuple(int(age.split("-")[0]) for age in AGE_LIST)
+AGE_MIDPOINTS = tuple(sum(map(int, age.split("-"))) / 2 for age in AGE_LIST)
+AGE_BUCKETS = tuple(_age_bucket(lo) for lo in AGE_LO)
+
 # Mean values used to normalize input images for the DNNs
+FACE_MEAN_VALUES = (104.0, 117.0, 123.0)
 MODEL_MEAN_VALUES = (78.4263377603, 87.7689143744, 114.895847746)
 
+# Input size of the face detection network
+FACE_SIZE = (300, 300)
+
+# Input size of the age and gender networks
+AGE_GENDER_SIZE = (227, 227)
+
 
 class DemographicsEstimator:
     """
@@ -33,9 +82,138 @@ class DemographicsEstimator:
 
     def __init__(self, conf_threshold: float = 0.7):
         self.conf_threshold = conf_threshold
-        self.face_net   = cv2.dnn.readNet(FACE_MODEL, FACE_PROTO)
-        self.age_net    = cv2.dnn.readNet(AGE_MODEL, AGE_PROTO)
-        self.gender_net = cv2.dnn.readNet(GENDER_MODEL, GENDER_PROTO)
+        self.face_net   = self._read_net(FACE_MODEL, FACE_PROTO, FACE_IR, FACE_SIZE)
+        self.age_net    = self._read_net(AGE_MODEL, AGE_PROTO, AGE_IR, AGE_GENDER_SIZE)
+        self.gender_net = self._read_net(GENDER_MODEL, GENDER_PROTO, GENDER_IR, AGE_GENDER_SIZE)
+
+        self.age_sess    = self._load_onnx(AGE_ONNX)
+        self.gender_sess = self._load_onnx(GENDER_ONNX)
+
+        # Reusable buffers for the resized inputs of the face and age/gender nets
+        self._face_scratch = np.empty((*FACE_SIZE, 3), dtype=np.uint8)
+        self._scratch = np.empty((*AGE_GENDER_SIZE, 3), dtype=np.uint8)
+
+    def _read_net(self, model_path, config_path, ir_path, input_size):
+        """
+        Load a network, preferring its quantized OpenVINO IR when usable.
+
+        The IR is loaded on the Inference Engine backend if the file exists
+        and OpenCV was built with OpenVINO; otherwise the original model is
+        loaded and configured by _configure_backend.
+
+        Args:
+            model_path (Path): Original model weights.
+            config_path (Path): Original model config / prototxt.
+            ir_path (Path): OpenVINO IR .xml file (weights in the sibling .bin).
+            input_size (tuple[int, int]): (width, height) of the network input.
+
+        Returns:
+            cv2.dnn.Net: Loaded network with backend and target set.
+        """
+
+        if ir_path.exists() and self._has_inference_engine():
+            net = cv2.dnn.readNet(str(ir_path), str(ir_path.with_suffix(".bin")))
+            net.setPreferableBackend(cv2.dnn.DNN_BACKEND_INFERENCE_ENGINE)
+            net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            return net
+
+        net = cv2.dnn.readNet(model_path, config_path)
+        self._configure_backend(net, input_size)
+        return net
+
+    @staticmethod
+    def _has_inference_engine():
+        """
+        Check whether OpenCV can run networks on the OpenVINO Inference Engine.
+
+        Returns:
+            bool: True if the Inference Engine backend offers a CPU target.
+        """
+
+        ie_backend = getattr(cv2.dnn, "DNN_BACKEND_INFERENCE_ENGINE", None)
+        if ie_backend is None:
+            return False
+        try:
+            return cv2.dnn.DNN_TARGET_CPU in cv2.dnn.getAvailableTargets(ie_backend)
+        except cv2.error:
+            return False
+
+    def _configure_backend(self, net, input_size):
+        """
+        Select the fastest available inference backend for a network.
+
+        Tries CUDA with FP16, then OpenCL with FP16 (e.g. Intel iGPUs), and
+        otherwise falls back to the default OpenCV CPU backend. Only targets
+        reported by OpenCV are attempted, and each one must survive a test
+        forward pass, since an unusable backend only fails at forward().
+
+        Args:
+            net (cv2.dnn.Net): Network to configure.
+            input_size (tuple[int, int]): (width, height) of the network input.
+        """
+
+        candidates = []
+        if hasattr(cv2, "cuda") and cv2.cuda.getCudaEnabledDeviceCount() > 0:
+            candidates.append((cv2.dnn.DNN_BACKEND_CUDA, cv2.dnn.DNN_TARGET_CUDA_FP16))
+        if cv2.ocl.haveOpenCL():
+            candidates.append((cv2.dnn.DNN_BACKEND_OPENCV, cv2.dnn.DNN_TARGET_OPENCL_FP16))
+
+        probe = np.zeros((1, 3, input_size[1], input_size[0]), dtype=np.float32)
+        for backend, target in candidates:
+            if target not in cv2.dnn.getAvailableTargets(backend):
+                continue
+            try:
+                net.setPreferableBackend(backend)
+                net.setPreferableTarget(target)
+                net.setInput(probe)
+                net.forward()
+                return
+            except cv2.error:
+                continue
+
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def _load_onnx(self, model_path):
+        """
+        Create an ONNX Runtime session for a model if it can be used.
+
+        Args:
+            model_path (Path): Path to the .onnx model file.
+
+        Returns:
+            onnxruntime.InferenceSession | None: Session with all graph
+                optimizations enabled, or None if onnxruntime is not installed
+                or the model file does not exist.
+        """
+
+        if ort is None or not model_path.exists():
+            return None
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        available = ort.get_available_providers()
+        providers = [p for p in ("CUDAExecutionProvider", "CPUExecutionProvider") if p in available]
+        return ort.InferenceSession(str(model_path), sess_options=options, providers=providers)
+
+    def _forward(self, net, sess, blob):
+        """
+        Run a network on a blob, preferring its ONNX Runtime session.
+
+        Args:
+            net (cv2.dnn.Net): OpenCV network used as fallback.
+            sess (onnxruntime.InferenceSession | None): Optional ORT session.
+            blob (np.ndarray): Input blob.
+
+        Returns:
+            np.ndarray: Network output.
+        """
+
+        if sess is not None:
+            return sess.run(None, {sess.get_inputs()[0].name: blob})[0]
+
+        net.setInput(blob)
+        return net.forward()
 
     def _detect_faces(self, frame):
         """
@@ -52,8 +230,9 @@ class DemographicsEstimator:
         """
 
         h, w = frame.shape[:2]
-        blob = cv2.dnn.blobFromImage(frame, 1.0, (300, 300),
-                                     [104, 117, 123], swapRB=False, crop=False)
+        cv2.resize(frame, FACE_SIZE, dst=self._face_scratch, interpolation=cv2.INTER_LINEAR)
+        blob = cv2.dnn.blobFromImage(self._face_scratch, 1.0, FACE_SIZE,
+                                     FACE_MEAN_VALUES, swapRB=False, crop=False)
         self.face_net.setInput(blob)
         detections = self.face_net.forward()
         faces = []
@@ -75,49 +254,60 @@ class DemographicsEstimator:
             face_img (np.ndarray): Face image in BGR format.
 
         Returns:
-            tuple[str, str]: (age_range, gender_label).
+            tuple[int, str]: (age_index, gender_label), where age_index
+                indexes AGE_LIST, AGE_BUCKETS and AGE_MIDPOINTS.
         """
 
+        # Resize the (possibly non-contiguous) crop straight into the scratch buffer
+        cv2.resize(face_img, AGE_GENDER_SIZE, dst=self._scratch, interpolation=cv2.INTER_LINEAR)
         blob = cv2.dnn.blobFromImage(
-            face_img, 1.0, (227, 227),
-            MODEL_MEAN_VALUES, swapRB=False
+            self._scratch, 1.0, AGE_GENDER_SIZE,
+            MODEL_MEAN_VALUES, swapRB=False, crop=False
         )
-        self.gender_net.setInput(blob)
-        g_pred = self.gender_net.forward()
-        gender_id = g_pred[0].argmax()
-        if g_pred[0][gender_id] < 0.65:
-            gender_id = -1
-        gender = GENDER_LIST[gender_id]
+        return self._run_age_gender(blob)[0]
+
+    def _predict_age_gender_batch(self, face_imgs):
+        """
+        Predict age range and gender for several face crops in one forward pass.
 
-        self.age_net.setInput(blob)
-        a_pred = self.age_net.forward()
-        age_str = AGE_LIST[a_pred[0].argmax()]
+        All crops are packed into a single (N, 3, 227, 227) blob so that each
+        network runs once per frame instead of once per face.
 
-        return age_str, gender
+        Args:
+            face_imgs (list[np.ndarray]): Face images in BGR format.
 
-    def _map_age_bucket(self, age_str):
+        Returns:
+            list[tuple[int, str]]: (age_index, gender_label) per face, in input order.
         """
-        Map a model age range into a coarse age bucket.
+
+        blob = cv2.dnn.blobFromImages(
+            face_imgs, 1.0, AGE_GENDER_SIZE,
+            MODEL_MEAN_VALUES, swapRB=False
+        )
+        return self._run_age_gender(blob)
+
+    def _run_age_gender(self, blob):
+        """
+        Run the age and gender networks on a prepared input blob.
 
         Args:
-            age_str (str): Age range string from AGE_LIST, e.g. "25-32".
+            blob (np.ndarray): Input blob of shape (N, 3, 227, 227).
 
         Returns:
-            str: One of "child", "young", "adult", "senior".
-        """
-
-        if "-" in age_str:
-            lo = int(age_str.split("-")[0])
-        else:
-            lo = 60
-        if lo < 18:
-            return "child"
-        elif 18 <= lo < 30:
-            return "young"
-        elif 40 <= lo <= 60:
-            return "adult"
-        else:
-            return "senior"
+            list[tuple[int, str]]: (age_index, gender_label) per blob item.
+        """
+
+        g_preds = self._forward(self.gender_net, self.gender_sess, blob)
+        gender_ids = g_preds.argmax(axis=1)
+        # Low-confidence genders map to the trailing "Unknown" label
+        gender_conf = g_preds[np.arange(len(g_preds)), gender_ids]
+        gender_ids = np.where(gender_conf < 0.65, -1, gender_ids)
+
+        a_preds = self._forward(self.age_net, self.age_sess, blob)
+        age_ids = a_preds.argmax(axis=1)
+
+        return [(int(age_id), GENDER_LIST[gender_id])
+                for age_id, gender_id in zip(age_ids.tolist(), gender_ids.tolist())]
 
     def analyze_frame(self, frame_bgr):
         """
@@ -136,13 +326,22 @@ class DemographicsEstimator:
         """
         
         results = []
-        faces = self._detect_faces(frame_bgr)
-        for (x1, y1, x2, y2, conf) in faces:
+        faces = []
+        face_imgs = []
+        for (x1, y1, x2, y2, conf) in self._detect_faces(frame_bgr):
             face = frame_bgr[y1:y2, x1:x2]
             if face.size == 0:
                 continue
-            age_str, gender = self._predict_age_gender(face)
-            bucket = self._map_age_bucket(age_str)
+            faces.append((x1, y1, x2, y2, conf))
+            face_imgs.append(face)
+
+        if not face_imgs:
+            return results
+
+        predictions = self._predict_age_gender_batch(face_imgs)
+        for (x1, y1, x2, y2, conf), (age_id, gender) in zip(faces, predictions):
+            age_str = AGE_LIST[age_id]
+            bucket = AGE_BUCKETS[age_id]
             results.append({
                 "bbox": (x1, y1, x2, y2),
                 "confidence": float(conf),
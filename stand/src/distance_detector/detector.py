@@ -1,13 +1,38 @@
 import os
 from pathlib import Path
-from collections import deque
 from typing import Optional
 
 import cv2
 import numpy as np
+import torch
 from ultralytics import YOLO
 
 
+# Frame height the depth heuristic (300 / box_height) was tuned for
+REFERENCE_HEIGHT = 480
+
+# Minimum IoU between consecutive boxes to keep the same track id
+TRACK_IOU_THRESHOLD = 0.3
+
+# Number of recent center shifts averaged by the slowdown check
+SPEED_WINDOW = 5
+
+# Center shifts collected before the slowdown check kicks in
+SPEED_WARMUP = 10
+
+# Half-size of the face crop relative to shoulder width (and bbox width as fallback)
+FACE_SHOULDER_RATIO = 0.5
+FACE_BOX_RATIO = 0.25
+
+# YOLO input size, the long side of the 320x240 detection frame; the default 640
+# would letterbox that frame back up and cost as much as a full-size one.
+# Engine/ONNX exports must be created with the same imgsz
+INFERENCE_IMGSZ = 320
+
+# While nobody is in view, run the model only on every N-th frame (N grows up to this)
+MAX_IDLE_STRIDE = 10
+
+
 class InteractiveStandDetector:
     """
     YOLOv8‑based detector for a person in front of the stand and distance estimation.
@@ -16,9 +41,11 @@ class InteractiveStandDetector:
         model_path (Path): Path to the YOLOv8 pose model file.
         model (YOLO): Loaded YOLOv8 pose model.
         activation_distance (float): Distance threshold in meters.
-        speed_history (deque[float]): Recent center shifts for slowdown check.
+        _speed_ring (list[float]): Last SPEED_WINDOW center shifts (ring buffer).
+        _speed_sum (float): Running sum of _speed_ring.
         last_center (tuple[int, int] | None): Last bbox center.
         slowing_down (bool): Whether the person is slowing down.
+        track_id (int | None): Id of the currently tracked person.
     """
 
     def __init__(self):
@@ -39,17 +66,85 @@ class InteractiveStandDetector:
         else:
             print(f"Local model found: {self.model_path}")
         
-        # Load local model
-        self.model = YOLO(self.model_path)
+        # Load local model, preferring optimized exports next to the .pt file:
+        # a TensorRT FP16 engine on CUDA hosts, created once with
+        # YOLO(model_path).export(format="engine", half=True, imgsz=INFERENCE_IMGSZ, device=0),
+        # then an ONNX export with the same imgsz (runs on ONNX Runtime)
+        cuda = torch.cuda.is_available()
+        engine_path = self.model_path.with_suffix(".engine")
+        onnx_path = self.model_path.with_suffix(".onnx")
+        if cuda and engine_path.exists():
+            model_file = engine_path
+        elif onnx_path.exists():
+            model_file = onnx_path
+        else:
+            model_file = self.model_path
+        print(f"Using model: {model_file}")
+        self.model = YOLO(model_file, task="pose")
+
+        # Half precision for the PyTorch model on GPU (an engine is already FP16)
+        self._half = cuda and model_file == self.model_path
         self.activation_distance = 2.0
         
         # Step‑slowdown analysis
-        self.speed_history = deque(maxlen=10)  # Last 10 speed values
+        # Ring buffer of the last center shifts with a running sum
+        self._speed_ring = [0.0] * SPEED_WINDOW
+        self._speed_idx = 0
+        self._speed_sum = 0.0
+        self._speed_count = 0
         self.last_center = None
         self.slowing_down = False
+
+        # Simple IoU tracking of the person across frames
+        self.track_id = None
+        self._last_box = None
+        self._next_track_id = 0
+
+        # Adaptive frame skipping while the stand is idle
+        self._idle_stride = 1
+        self._frame_ctr = 0
         
         print("ДDetector is ready.")
 
+    def _update_track(self, box):
+        """
+        Assign a track id to the current bbox by IoU with the previous one.
+
+        Args:
+            box (np.ndarray | None): Current bbox (x1, y1, x2, y2), or None
+                if nobody is detected.
+
+        Returns:
+            int | None: Track id of the person, None if nobody is detected.
+        """
+
+        if box is None:
+            self._last_box = None
+            self.track_id = None
+            return None
+
+        if self._last_box is None or self._iou(box, self._last_box) < TRACK_IOU_THRESHOLD:
+            self.track_id = self._next_track_id
+            self._next_track_id += 1
+
+        self._last_box = box
+        return self.track_id
+
+    @staticmethod
+    def _iou(a, b):
+        """
+        Intersection over union of two (x1, y1, x2, y2) boxes.
+
+        Returns:
+            float: IoU in [0, 1].
+        """
+
+        ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+        iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+        inter = ix * iy
+        union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+        return inter / union if union > 0 else 0.0
+
     def _analyze_speed(self, center):
         """
         Check if the person is slowing down based on bbox center movement.
@@ -66,15 +161,17 @@ class InteractiveStandDetector:
             return False
         
         # Speed in pixels per frame (assuming ~30 FPS)
-        dx = abs(center[0] - self.last_center[0])
-        self.speed_history.append(dx)
+        dx = float(abs(center[0] - self.last_center[0]))
+        self._speed_sum += dx - self._speed_ring[self._speed_idx]
+        self._speed_ring[self._speed_idx] = dx
+        self._speed_idx = (self._speed_idx + 1) % SPEED_WINDOW
+        self._speed_count = min(self._speed_count + 1, SPEED_WARMUP)
         
-        if len(self.speed_history) >= 10:
-            avg_speed = np.mean(list(self.speed_history)[-5:])
+        if self._speed_count >= SPEED_WARMUP:
             self.last_center = center
             
-            # Slowdown: speed < 0.8 pixels per frame
-            if avg_speed < 0.8:
+            # Slowdown: average speed < 0.8 pixels per frame
+            if self._speed_sum < 0.8 * SPEED_WINDOW:
                 self.slowing_down = True
                 return True
             else:
@@ -82,7 +179,22 @@ class InteractiveStandDetector:
         
         return False
 
-    def get_person_depth(self, frame) -> Optional[tuple[float, np.array]]:
+    def skip_idle_frame(self) -> bool:
+        """
+        Check whether the model may be skipped on the next frame.
+
+        While nobody is tracked, only every N-th frame is analyzed, with N
+        growing up to MAX_IDLE_STRIDE as the scene stays empty. Callers that
+        gate inference on it should not treat skipped frames as analyzed.
+
+        Returns:
+            bool: True if get_person_depth does not need to run on this frame.
+        """
+
+        self._frame_ctr += 1
+        return self.last_center is None and self._frame_ctr % self._idle_stride != 0
+
+    def get_person_depth(self, frame) -> Optional[tuple[float, np.array, int, float]]:
         """
         Estimate distance to a person on the frame using YOLOv8 pose.
 
@@ -90,18 +202,28 @@ class InteractiveStandDetector:
             frame (np.ndarray): BGR frame from OpenCV.
 
         Returns:
-            Optional[tuple[float, np.ndarray]]:
-                (distance_m, nose_xy) if pose is confident, otherwise None.
+            Optional[tuple[float, np.ndarray, int, float]]:
+                (distance_m, nose_xy, track_id, face_half_size) if pose is
+                confident, otherwise None. face_half_size is the half-size in
+                pixels of a square face region centered on the nose.
         """
         
-        results = self.model(frame, verbose=False)
+        results = self.model(frame, verbose=False, half=self._half, imgsz=INFERENCE_IMGSZ)
         
         # If no people are detected – return None
         if len(results[0].boxes) == 0:
             self.last_center = None  # Reset speed tracking
+            self._update_track(None)
+            self._idle_stride = min(self._idle_stride + 1, MAX_IDLE_STRIDE)
             return None
-        
-        keypoints = results[0].keypoints
+
+        self._idle_stride = 1
+
+        # Move the whole result to host memory once instead of syncing per tensor
+        result = results[0].cpu().numpy()
+        boxes = result.boxes.xyxy
+        kp_conf = result.keypoints.conf
+        kp_xy = result.keypoints.xy
         
         # Если нет ключевых точек — fallback на bbox без проверки pose
         # if len(keypoints) == 0:
@@ -119,7 +241,7 @@ class InteractiveStandDetector:
         #     return distance, keypoints.xy[0].cpu().numpy()[0]
         
         # Get confidence scores for keypoints of the first detection
-        conf = keypoints.conf[0].cpu().numpy()
+        conf = kp_conf[0]
         
         # YOLOv8 Pose keypoint indices:
         # 0 - nose (head)
@@ -134,8 +256,10 @@ class InteractiveStandDetector:
         
         # Check that the head and at least one shoulder are confident enough
         if nose_conf > threshold and (left_shoulder_conf > threshold or right_shoulder_conf > threshold):
-            box = results[0].boxes.xyxy[0].cpu().numpy()
-            box_height = box[3] - box[1]
+            box = boxes[0]
+            track_id = self._update_track(box)
+            # Normalize the bbox height so the estimate does not depend on frame size
+            box_height = (box[3] - box[1]) * REFERENCE_HEIGHT / frame.shape[0]
             distance = max(0.5, 300 / box_height)
             
             # Analyze speed for this bbox center
@@ -146,11 +270,18 @@ class InteractiveStandDetector:
             # Green if we have a confident person + slowdown, yellow otherwise
             color = (0, 255, 0) if slowing_down else (0, 255, 255)
             cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+
+            # Face region from the shoulder span, or from the bbox width if a shoulder is unsure
+            if left_shoulder_conf > threshold and right_shoulder_conf > threshold:
+                face_half = FACE_SHOULDER_RATIO * float(np.linalg.norm(kp_xy[0][5] - kp_xy[0][6]))
+            else:
+                face_half = FACE_BOX_RATIO * float(box[2] - box[0])
             
-            return distance, keypoints.xy[0].cpu().numpy()[0]
+            return distance, kp_xy[0][0], track_id, face_half
         else:
             # If data is not confident enough – draw red bbox and return None
-            box = results[0].boxes.xyxy[0].cpu().numpy()
+            box = boxes[0]
+            self._update_track(box)
             center = ((box[0] + box[2]) // 2, (box[1] + box[3]) // 2)
             self._analyze_speed(center)  # Still track speed
             
@@ -1,18 +1,23 @@
+import os
 import json
 import time
+import queue
 import logging
 import requests
 from pathlib import Path
 from datetime import datetime
 from typing import Optional
 import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import cv2
 import numpy as np
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # custom modules
 from distance_detector import InteractiveStandDetector
-from demographics_detector import DemographicsEstimator
+from demographics_detector import DemographicsEstimator, AGE_LIST, AGE_BUCKETS, AGE_MIDPOINTS
 
 
 logging.basicConfig(
@@ -25,6 +30,44 @@ logging.basicConfig(
 API = "http://localhost:8000"
 STANDS = "/api/stands/push"
 DATA = "/api/visits/push"
+AUDIO = "http://localhost:5000/control-audio"
+
+# Camera capture resolution; age/gender crops are taken from frames of this size
+CAPTURE_SIZE = (640, 480)
+
+# Frame size used for person and face detection
+DETECTION_SIZE = (320, 240)
+
+# How long demographics of a tracked person are reused, in seconds
+DEMOGRAPHICS_TTL = 5.0
+
+# Pause between pose inferences by distance of the last seen person: (min distance m, seconds)
+INFERENCE_INTERVALS = ((5.0, 0.5), (2.0, 0.1))
+
+# Thumbnail size and mean pixel difference below which a frame counts as unchanged
+MOTION_SIZE = (32, 24)
+MOTION_THRESHOLD = 3.0
+
+# Keep-alive session reused by the long-running pipeline loop
+SESSION = requests.Session()
+SESSION.headers.update({
+    "Content-Type": "application/json",
+    "User-Agent": "DataSender/1.0"
+})
+# Status and read-error retries only cover idempotent methods (GET for audio control);
+# POST uploads are retried on connection errors alone, so a visit is never inserted twice
+SESSION.mount("http://", HTTPAdapter(
+    pool_maxsize=4,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504],
+                      allowed_methods=Retry.DEFAULT_ALLOWED_METHODS)
+))
+
+# Single worker keeps uploads in submission order (stand before its visits)
+UPLOADER = ThreadPoolExecutor(max_workers=1)
+
+# Audio control runs apart from uploads so a slow storage service never delays it;
+# a single worker keeps play/stop in order
+AUDIO_CONTROL = ThreadPoolExecutor(max_workers=1)
 
 
 def send_data(api_url: str, data: dict):
@@ -39,34 +82,82 @@ def send_data(api_url: str, data: dict):
         requests.Response | None: Response object on success, None on error.
     """
 
-    headers = {
-        "Content-Type": "application/json",
-        "User-Agent": "DataSender/1.0"
-    }
     try:
-        response = requests.post(
-            api_url,
-            json=data,
-            headers=headers,
-            timeout=10
-        )
-        return response
+        return SESSION.post(api_url, json=data, timeout=10)
     except Exception as err:
         logging.error(err)
 
     return None
 
 
+def send_data_async(api_url: str, data: dict) -> Future:
+    """
+    Queue a JSON payload for sending without blocking the caller.
+
+    Args:
+        api_url (str): Full endpoint URL.
+        data (dict): Arbitrary JSON‑serializable payload.
+
+    Returns:
+        Future: Resolves to the result of send_data.
+    """
+
+    return UPLOADER.submit(send_data, api_url, data)
+
+
+def control_audio_async(action: str) -> Future:
+    """
+    Ask the stand front-end to play or stop audio without blocking the caller.
+
+    Args:
+        action (str): "play" or "stop".
+
+    Returns:
+        Future: Resolves to the response, or None on error.
+    """
+
+    def request():
+        try:
+            return SESSION.get(AUDIO, params={"action": action}, timeout=10)
+        except Exception as err:
+            logging.error(err)
+        return None
+
+    return AUDIO_CONTROL.submit(request)
+
+
+def put_latest(q: queue.Queue, item) -> None:
+    """
+    Put an item into a bounded queue, dropping the oldest entry when it is full.
+
+    Args:
+        q (queue.Queue): Target queue.
+        item: Item to enqueue.
+    """
+
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
+
 class Pipeline:
     """
     Orchestrates the full stand pipeline: camera → distance detector →
     demographics → API calls.
 
-    Loads stand config, initializes detectors and runs the main loop in a
-    background thread.
+    Loads stand config, initializes detectors and runs the work in background
+    threads: capture, pose (YOLO) and demographics/activation stages joined
+    by single-slot drop-oldest queues, so the stages overlap and each one
+    always works on the newest data. API uploads run on a separate worker.
     """
 
-    def __init__(self, config: str | Path) -> None:
+    def __init__(self, config: str | Path, show_gui: bool = False) -> None:
         if isinstance(config, str):
             config = Path(config).resolve().expanduser()
 
@@ -78,10 +169,17 @@ class Pipeline:
 
         self.msg_config = self.config["config"]
 
-        send_data(f"{API}{STANDS}", self.msg_config)
+        send_data_async(f"{API}{STANDS}", self.msg_config)
 
         self._stop_event = threading.Event()
-        self._thread = None
+        self._threads = []
+
+        # Stage hand-offs (capture -> pose -> demographics); only the freshest item is kept
+        self._frame_q = queue.Queue(maxsize=1)
+        self._pose_q = queue.Queue(maxsize=1)
+
+        # Debug preview window; headless kiosks run without any GUI calls
+        self.show_gui = show_gui
 
         self._movement_distance_detector = InteractiveStandDetector()
         self._demographic_detector = DemographicsEstimator()
@@ -90,7 +188,16 @@ class Pipeline:
         self.deactivation_time = 2.0
         self.activated = False
 
+        # Last audio action sent to the front-end; only changes are sent
+        self._audio_action = None
+
         self._cap = cv2.VideoCapture(0)
+        # Ask the camera for small MJPG frames instead of its (often HD) default
+        self._cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+        self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAPTURE_SIZE[0])
+        self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAPTURE_SIZE[1])
+        # Keep at most one frame in the driver buffer so grabs are never stale
+        self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
 
         self.human_info = None
 
@@ -98,31 +205,138 @@ class Pipeline:
         self._finished_at = 0
         self._time_activated = None
         self._time_started = 0
-    
-    def _loop(self):
+
+        # Frame-change gating: last thumbnail and the depth result computed for it
+        self._last_thumb = None
+        self._last_dist = None
+        self._next_infer_ts = 0.0
+
+        # Demographics per track id: {track_id: (info, timestamp)}
+        self._demographics_cache = {}
+
+    def _frame_changed(self, small: np.array) -> bool:
+        """
+        Check whether the scene changed noticeably since the last inference.
+
+        Compares a tiny grayscale thumbnail of the frame with the previous one
+        by mean absolute pixel difference.
+
+        Args:
+            small (np.ndarray): Downscaled BGR frame.
+
+        Returns:
+            bool: True if inference should run on this frame.
+        """
+
+        thumb = cv2.cvtColor(cv2.resize(small, MOTION_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        thumb = thumb.astype(np.int16)
+        if self._last_thumb is not None and np.abs(thumb - self._last_thumb).mean() < MOTION_THRESHOLD:
+            return False
+
+        self._last_thumb = thumb
+        return True
+
+    def _inference_interval(self, dist) -> float:
+        """
+        Pick the pause before the next pose inference from the last result.
+
+        Far away visitors are checked less often; nearby ones (and frames
+        without a confident pose) on every frame.
+
+        Args:
+            dist (tuple | None): Last result of get_person_depth.
+
+        Returns:
+            float: Seconds to wait before running the pose model again.
         """
-        Main processing loop.
 
-        Reads frames from the camera, checks person distance, triggers
-        activation/deactivation, collects stats and sends them to the API.
+        if dist:
+            for min_distance, interval in INFERENCE_INTERVALS:
+                if dist[0] > min_distance:
+                    return interval
+        return 0.0
+
+    def _capture_loop(self):
+        """
+        Capture stage.
+
+        Grabs frames from the camera continuously and decodes only those the
+        inference stage is ready to take, downscaling them for detection.
         """
 
         try:
-            while True:
-                ret, frame = self._cap.read()
-                
+            while not self._stop_event.is_set():
+                if not self._cap.grab():
+                    raise RuntimeError("Error while reading video capture")
+
+                # Pose stage still busy with the previous frame: skip decoding this one
+                if not self._frame_q.empty():
+                    continue
+
+                ret, frame = self._cap.retrieve()
                 if not ret:
                     raise RuntimeError("Error while reading video capture")
 
-                dist = self._movement_distance_detector.get_person_depth(frame)
+                # Detectors resize internally anyway, so feed them a small copy
+                small = cv2.resize(frame, DETECTION_SIZE, interpolation=cv2.INTER_AREA)
+                put_latest(self._frame_q, (frame, small))
+        except Exception as err:
+            logging.error(err)
+            self._stop_event.set()
+
+        self._cap.release()
+
+    def _pose_loop(self):
+        """
+        Pose stage.
+
+        Runs the YOLO distance detector on captured frames and hands the
+        result together with the frame to the demographics stage.
+        """
+
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    frame, small = self._frame_q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+
+                # Reuse the previous result while the scene stays still, the last seen
+                # person is too far away to need every frame, or the empty scene is on
+                # its idle stride; the stride is checked before _frame_changed so only
+                # frames the model actually runs on update the motion thumbnail
+                now = time.time()
+                detector = self._movement_distance_detector
+                if now >= self._next_infer_ts and not detector.skip_idle_frame() and self._frame_changed(small):
+                    self._last_dist = detector.get_person_depth(small)
+                    self._next_infer_ts = now + self._inference_interval(self._last_dist)
+                put_latest(self._pose_q, (frame, small, self._last_dist))
+        except Exception as err:
+            logging.error(err)
+            self._stop_event.set()
+
+    def _demographics_loop(self):
+        """
+        Demographics stage.
+
+        Checks person distance, runs demographics on activation, handles
+        deactivation, collects stats and queues them for upload to the API.
+        """
+
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    frame, small, dist = self._pose_q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
 
                 if dist and dist[0] <= self.activation_distance and not self.activated:
                     self._time_started = time.time()
-                    self.human_info = self._analyze_frame(frame, dist[1])
+                    self.human_info = self._analyze_frame(frame, small, dist[1], dist[2], dist[3])
                     if self.human_info:
                         self._activate()
                         print("Welcome!")
-                    requests.get('http://localhost:5000/control-audio?action=play')
+                    self._control_audio("play")
                 elif dist and dist[0] > self.activation_distance and self.activated and (time.time() - self._time_started) > self.deactivation_time:
                     self._time_started = 0
                     self._deactivate()
@@ -131,66 +345,110 @@ class Pipeline:
                     stats["name"] = self.msg_config["name"]
                     stats["datetime"] = self._time_activated
                     stats["time_elapsed"] = time_elapsed
-                    send_data(f"{API}{DATA}", stats)
+                    send_data_async(f"{API}{DATA}", stats)
                     print(stats)
                     print("Good bye!")
-                    requests.get('http://localhost:5000/control-audio?action=stop')
+                    self._control_audio("stop")
 
-                if self._stop_event.wait(timeout=0.01):
-                    break
-
-                # cv2.imshow('Distance Detector', frame)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+                if self.show_gui:
+                    cv2.imshow('Distance Detector', small)
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
         except Exception as err:
             logging.error(err)
 
-        self._cap.release()
-        cv2.destroyAllWindows()
-            
-    def _analyze_frame(self, frame: np.array, nose_pos: np.array) -> Optional[dict]:
+        self._stop_event.set()
+        if self.show_gui:
+            cv2.destroyAllWindows()
+
+    def _analyze_frame(self, frame: np.array, small: np.array, nose_pos: np.array, track_id: int, face_half: float) -> Optional[dict]:
         """
-        Select the face closest to the detected nose and estimate demographics.
+        Estimate demographics of the tracked person, reusing a recent result.
+
+        Demographics computed for the same track id less than DEMOGRAPHICS_TTL
+        seconds ago are returned without running the networks again.
 
         Args:
-            frame (np.ndarray): BGR frame from the camera.
-            nose_pos (np.ndarray): Nose keypoint coordinates (x, y).
+            frame (np.ndarray): Full resolution BGR frame from the camera.
+            small (np.ndarray): Downscaled copy of frame used for detection.
+            nose_pos (np.ndarray): Nose keypoint coordinates (x, y) in small.
+            track_id (int): Track id of the person from the distance detector.
+            face_half (float): Half-size of the face region around the nose in small.
 
         Returns:
-            dict | None: Demographics info for the best face
+            dict | None: Demographics info for the face
                 (gender, group, age_group, age) or None if no face is suitable.
         """
 
-        bboxes = self._demographic_detector._detect_faces(frame)
+        now = time.time()
+        cached = self._demographics_cache.get(track_id)
+        if cached and now - cached[1] < DEMOGRAPHICS_TTL:
+            return dict(cached[0])
+
+        info = self._estimate_demographics(frame, small, nose_pos, face_half)
+        if info:
+            self._demographics_cache = {
+                tid: entry for tid, entry in self._demographics_cache.items()
+                if now - entry[1] < DEMOGRAPHICS_TTL
+            }
+            self._demographics_cache[track_id] = (dict(info), now)
+        return info
+
+    def _estimate_demographics(self, frame: np.array, small: np.array, nose_pos: np.array, face_half: float) -> Optional[dict]:
+        """
+        Estimate demographics from the face region around the detected nose.
 
-        nx, ny = nose_pos
-        
-        dist_face = None
-        min_dist = float("inf")
-        max_conf = 0
-
-        for face in bboxes:
-            x1, y1, x2, y2, conf = face
-            x0 = (x1 + x2) / 2
-            y0 = (y1 + y2) / 2
-            dist = np.sqrt((x0 - nx) ** 2 + (y0 - ny) ** 2)
-            
-            if dist < min_dist and conf > max_conf:
-                dist_face = face
-                min_dist = dist
-                max_conf = conf
-
-        if not dist_face:
-            return None
+        The region comes from the pose keypoints, so no separate face
+        detection is run; it is mapped back to full resolution for the
+        age/gender crop.
+
+        Args:
+            frame (np.ndarray): Full resolution BGR frame from the camera.
+            small (np.ndarray): Downscaled copy of frame used for detection.
+            nose_pos (np.ndarray): Nose keypoint coordinates (x, y) in small.
+            face_half (float): Half-size of the face region around the nose in small.
+
+        Returns:
+            dict | None: Demographics info for the face
+                (gender, group, age_group, age) or None if no face is suitable.
+        """
 
-        x1, y1, x2, y2, conf = dist_face
-        face_img = frame[max(0, y1 - 20):y2 + 20, max(0, x1 - 20):x2 + 20]
+        sx = frame.shape[1] / small.shape[1]
+        sy = frame.shape[0] / small.shape[0]
+        nx, ny = nose_pos[0] * sx, nose_pos[1] * sy
+        rx, ry = face_half * sx, face_half * sy
+
+        x1, y1 = max(0, int(nx - rx)), max(0, int(ny - ry))
+        x2, y2 = int(nx + rx), int(ny + ry)
+        face_img = frame[y1:y2, x1:x2]
         if face_img.size == 0:
             return None
-        age_str, gender = self._demographic_detector._predict_age_gender(face_img)
-        bucket = self._demographic_detector._map_age_bucket(age_str)
+        age_id, gender = self._demographic_detector._predict_age_gender(face_img)
+
+        return {"gender": gender, "group": AGE_BUCKETS[age_id], "age_group": AGE_LIST[age_id], "age": AGE_MIDPOINTS[age_id]}
+
+    def _control_audio(self, action: str):
+        """
+        Send an audio action to the front-end if playback is not already in that state.
+
+        Repeated requests for the current state are dropped, so the single
+        audio worker never queues a backlog of identical commands.
 
-        return {"gender": gender, "group": bucket, "age_group": age_str, "age": sum(map(int, age_str.split("-"))) / 2}
+        Args:
+            action (str): "play" or "stop".
+        """
+
+        if action == self._audio_action:
+            return
+
+        self._audio_action = action
+
+        def forget_failed(future: Future):
+            # The front-end never got it: let the next frame send the action again
+            if not future.cancelled() and future.result() is None and self._audio_action == action:
+                self._audio_action = None
+
+        control_audio_async(action).add_done_callback(forget_failed)
 
     def _activate(self):
         """
@@ -211,50 +469,54 @@ class Pipeline:
 
     def _is_running(self):
         """
-        Check whether the main loop thread is currently running.
+        Check whether any pipeline stage thread is currently running.
 
         Returns:
-            bool: True if the pipeline thread is alive, False otherwise.
+            bool: True if a pipeline thread is alive, False otherwise.
         """
 
-        return self._thread is not None and self._thread.is_alive()
+        return any(thread.is_alive() for thread in self._threads)
 
     def start(self) -> bool:
         """
-        Start the pipeline in a background thread.
+        Start the pipeline stages in background threads.
 
         Returns:
-            bool: True if the thread was started, False if it was already running.
+            bool: True if the threads were started, False if already running.
         """
          
         if not self._is_running():
             self._stop_event.clear()
-            self._thread = threading.Thread(target=self._loop)
-            self._thread.daemon = True
-            self._thread.start()
+            self._threads = [
+                threading.Thread(target=self._capture_loop, daemon=True),
+                threading.Thread(target=self._pose_loop, daemon=True),
+                threading.Thread(target=self._demographics_loop, daemon=True),
+            ]
+            for thread in self._threads:
+                thread.start()
             return True
         return False
 
     def stop(self) -> bool:
         """
-        Stop the pipeline and wait for the loop thread to finish.
+        Stop the pipeline and wait for the stage threads to finish.
 
         Returns:
             bool: Always True after stop is requested.
         """
         
         self._stop_event.set()
-        if self._thread and self._thread.is_alive():
-            self._thread.join(timeout=2.0)
-            if self._thread.is_alive():
-                pass
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join(timeout=2.0)
         
         return True
 
 
 def main():
     config_path = Path("../shared/examples/stand1/config.json").absolute().resolve()
-    pipeline = Pipeline(config_path)
+    # STAND_DEBUG=1 opens the preview window; kiosks run headless by default
+    pipeline = Pipeline(config_path, show_gui=os.environ.get("STAND_DEBUG") == "1")
 
     try:
         started = pipeline.start()
@@ -266,6 +528,10 @@ def main():
     except Exception as err:
         pipeline.stop()
         logging.error(err)
+    finally:
+        # Deliver visits still queued for upload before exiting
+        UPLOADER.shutdown(wait=True)
+        AUDIO_CONTROL.shutdown(wait=False)
 
 
 if __name__ == "__main__":
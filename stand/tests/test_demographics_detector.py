@@ -0,0 +1,31 @@
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+STAND_DIR = Path(__file__).resolve().parent.parent
+
+# Model paths are resolved relative to the stand directory at import time
+os.chdir(STAND_DIR)
+sys.path.insert(0, str(STAND_DIR / "src"))
+
+from demographics_detector import DemographicsEstimator, AGE_LIST  # noqa: E402
+
+
+def test_estimator_builds_and_analyzes_frame():
+    estimator = DemographicsEstimator()
+
+    assert estimator.analyze_frame(np.zeros((480, 640, 3), dtype=np.uint8)) == []
+
+
+def test_age_gender_batch_decodes_predictions():
+    estimator = DemographicsEstimator()
+    faces = [np.full((120, 100, 3), value, dtype=np.uint8) for value in (60, 180)]
+
+    predictions = estimator._predict_age_gender_batch(faces)
+
+    assert len(predictions) == len(faces)
+    for age_id, gender in predictions:
+        assert 0 <= age_id < len(AGE_LIST)
+        assert gender in ("Male", "Female", "Unknown")
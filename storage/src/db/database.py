@@ -1,76 +1,177 @@
 from pathlib import Path
+import queue
 import sqlite3
+import threading
 from contextlib import contextmanager
-from typing import Iterator, List, Dict, Any
+from typing import Iterator, List, Dict, Any, Optional
+
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+)
+
+# Version of shared/db/init.sql stored in PRAGMA user_version; bump it whenever the script changes
+SCHEMA_VERSION = 3
+
+# Tables truncate_table may be called on; the name is interpolated into the DELETE
+TRUNCATABLE_TABLES = frozenset({"sections", "stands", "visits"})
+
+# Prepared statements kept per connection by the sqlite3 module, keyed by SQL text
+STATEMENT_CACHE_SIZE = 128
 
 
 class Database:
     """SQLite database helper with initialization and query execution."""
 
-    def __init__(self, init_path: str | Path, db_path: str | Path):
-        """Initialize database with schema from init_path and open db at db_path."""
+    def __init__(self, init_script: str, db_path: str | Path, pool_size: int = 5):
+        """Initialize database with the init_script SQL and open db at db_path."""
 
         self.db_path = db_path
-        self.init_path = init_path
+        self.init_script = init_script
+
+        # Single long-lived writer connection shared by all requests, guarded by a lock
+        self._conn = self._connect()
+        self._lock = threading.RLock()
+
         self._init_base()
 
+        # Bounded pool of read-only connections; LIFO keeps the warmest ones in use
+        self._readers: List[sqlite3.Connection] = [self._connect(readonly=True) for _ in range(pool_size)]
+        self._pool: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue(maxsize=pool_size)
+        for conn in self._readers:
+            self._pool.put(conn)
+
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        """Open a new SQLite connection with the tuned PRAGMAs applied."""
+
+        # Autocommit driver mode: writers open their transactions explicitly in _transaction
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        if readonly:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
     def _init_base(self):
-        """Run SQL initialization script on the database."""
+        """Run SQL initialization script on the database unless its schema is already current."""
 
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            
-            with open(self.init_path, "r", encoding="utf-8") as init_file:
-                init_script = init_file.read()
 
-            cursor.executescript(init_script)
-            conn.commit()
+            cursor.execute("PRAGMA user_version")
+            if cursor.fetchone()[0] == SCHEMA_VERSION:
+                return
+
+            # executescript commits any open transaction first, so the script carries its own
+            try:
+                cursor.executescript(f"BEGIN IMMEDIATE;\n{self.init_script}\n"
+                                     f"PRAGMA user_version = {SCHEMA_VERSION};\nCOMMIT;")
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
 
     @contextmanager
-    def get_connection(self) -> Iterator[sqlite3.Connection]:
-        """Context manager for SQLite database connection."""
+    def _transaction(self, conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+        """
+        Run the block in a write transaction on conn.
 
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
+        BEGIN IMMEDIATE takes the write lock up front, so a busy database is
+        waited on (busy_timeout) before any work instead of failing mid-way.
+        """
+
+        conn.execute("BEGIN IMMEDIATE")
         try:
             yield conn
-        finally:
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @contextmanager
+    def get_connection(self, readonly: bool = False) -> Iterator[sqlite3.Connection]:
+        """
+        Context manager for SQLite database connection.
+
+        Writers get exclusive access to the shared connection; readonly callers
+        check out a reader from the pool and return it on exit.
+        """
+
+        if readonly:
+            conn = self._pool.get()
+            try:
+                yield conn
+            finally:
+                self._pool.put(conn)
+            return
+
+        with self._lock:
+            yield self._conn
+
+    def close(self) -> None:
+        """Close the writer and all reader connections."""
+
+        for conn in self._readers:
             conn.close()
+        self._readers.clear()
+
+        with self._lock:
+            self._conn.close()
     
-    def get(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
-        """Execute a SELECT query and return a list of rows as dictionaries."""
+    def get(self, query: str, params: tuple = (), conn: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
+        """
+        Execute a SELECT query and return a list of rows as dictionaries.
 
-        with self.get_connection() as conn:
+        An already open connection may be passed to run several queries on it.
+        """
+
+        if conn is not None:
+            # Plain tuples zipped with one shared column list instead of a Row per row
             cursor = conn.cursor()
+            cursor.row_factory = None
             cursor.execute(query, params)
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+        with self.get_connection(readonly=True) as conn:
+            return self.get(query, params, conn)
     
     def execute(self, query: str, params: tuple = ()) -> None:
         """Execute a query that modifies the database (INSERT, UPDATE, DELETE)."""
 
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(query, params)
-            conn.commit()
+        with self.get_connection() as conn, self._transaction(conn):
+            conn.execute(query, params)
+
+    def executemany(self, query: str, seq_of_params) -> None:
+        """Execute a modifying query for every parameter tuple in a single transaction."""
+
+        with self.get_connection() as conn, self._transaction(conn):
+            conn.executemany(query, seq_of_params)
 
     def truncate_table(self, table_name: str, cascade: bool = False) -> int:
         """
         Delete all rows in a table with optional foreign key cascade control.
 
-        Returns the number of deleted rows before truncation.
-        Raises Exception on failure.
+        Returns the number of deleted rows.
+        Raises ValueError for unknown tables and sqlite3.Error on failure
+        (sqlite3.IntegrityError if other rows still reference the table).
         """
 
+        if table_name not in TRUNCATABLE_TABLES:
+            raise ValueError(f"Table {table_name} can not be truncated")
+
         with self.get_connection() as conn:
             cursor = conn.cursor()
             
-            cursor.execute(f"SELECT COUNT(*) as count FROM {table_name}")
-            count_before = cursor.fetchone()['count']
-            
-            if count_before == 0:
-                return 0
-            
+            # PRAGMA foreign_keys is a no-op inside a transaction, so toggle it around one
             foreign_keys_state = None
             if cascade:
                 cursor.execute("PRAGMA foreign_keys")
@@ -78,18 +179,16 @@ class Database:
                 cursor.execute("PRAGMA foreign_keys = OFF")
             
             try:
-                cursor.execute(f"DELETE FROM {table_name}")
-                conn.commit()
-                
-                cursor.execute(f"DELETE FROM sqlite_sequence WHERE name='{table_name}'")
-                conn.commit()
-                
-                if cascade and foreign_keys_state:
-                    cursor.execute(f"PRAGMA foreign_keys = {foreign_keys_state}")
-                
-                return count_before
+                with self._transaction(conn):
+                    cursor.execute(f"DELETE FROM {table_name}")
+                    deleted = cursor.rowcount
+                    cursor.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table_name,))
+                return deleted
                 
             except sqlite3.Error as e:
-                conn.rollback()
-                raise Exception(f"ОError truncating table {table_name}: {e}")
+                # Keep the sqlite3 error class so callers can tell constraint failures apart
+                raise type(e)(f"Error truncating table {table_name}: {e}") from e
 
+            finally:
+                if cascade and foreign_keys_state:
+                    cursor.execute(f"PRAGMA foreign_keys = {foreign_keys_state}")
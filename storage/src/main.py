@@ -1,11 +1,16 @@
 import json
+import sqlite3
+import time
 import logging
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from contextlib import asynccontextmanager
-from typing import List
+from typing import Dict, Final, List, Optional, Tuple
 
 from pydantic import BaseModel
-from fastapi import FastAPI, Request, Query
+from fastapi import FastAPI, HTTPException, Request, Query
+from fastapi.responses import ORJSONResponse
 import uvicorn
 
 from db import Database
@@ -18,10 +23,117 @@ logging.basicConfig(
 )
 
 
-DB_PATH = Path("../shared/db/data.db").resolve().absolute()
-INIT_FILE = Path("../shared/db/init.sql").resolve().absolute()
+DB_PATH: Final[Path] = Path("../shared/db/data.db").resolve().absolute()
+INIT_FILE: Final[Path] = Path("../shared/db/init.sql").resolve().absolute()
+INIT_SQL: Final[str] = INIT_FILE.read_text(encoding="utf-8")
+
+SECTION_INSERT_QUERY = '''INSERT INTO sections (label, description)
+                          VALUES (?, ?)
+                          ON CONFLICT(label) DO NOTHING'''
+
+SECTIONS_QUERY = "SELECT * FROM sections ORDER BY id"
+
+STANDS_QUERY = "SELECT * FROM stands ORDER BY id"
+
+STAND_BY_ID_QUERY = "SELECT * FROM stands WHERE id = ?"
+
+STAND_NAMES_QUERY = "SELECT name FROM stands ORDER BY id DESC"
+
+STAND_INSERT_QUERY = '''INSERT INTO stands (section_id, name, description)
+                        SELECT
+                            sec.id,
+                            ?,
+                            ?
+                        FROM sections sec
+                        WHERE sec.label = ?'''
+
+VISITS_QUERY = "SELECT * FROM visits ORDER BY timestamp DESC, id DESC LIMIT ?"
+
+VISITS_BEFORE_QUERY = '''SELECT * FROM visits
+                         WHERE (timestamp, id) < (?, ?)
+                         ORDER BY timestamp DESC, id DESC
+                         LIMIT ?'''
+
+VISITS_PAGE_QUERY = '''SELECT * FROM visits
+                       ORDER BY timestamp DESC, id DESC
+                       LIMIT ? OFFSET ?'''
+
+VISIT_BY_ID_QUERY = "SELECT * FROM visits WHERE id = ?"
+
+VISIT_INSERT_QUERY = '''INSERT INTO visits (stand_id, gender, age_group, age, timestamp, time_elapsed)
+                        SELECT
+                            stnd.id,
+                            ?,
+                            ?,
+                            ?,
+                            ?,
+                            ?
+                        FROM stands stnd
+                        WHERE stnd.name = ?'''
+
+STAND_STATS_QUERY = '''WITH
+                         stand AS (
+                             SELECT id FROM stands WHERE name = ?
+                         ),
+                         v AS (
+                             SELECT id, age, time_elapsed, age_group, gender
+                             FROM visits
+                             WHERE stand_id = (SELECT id FROM stand)
+                                 AND timestamp >= ?
+                                 AND timestamp < DATE(?, '+1 day')
+                         )
+                     SELECT
+                         AVG(v.age) as avg_age,
+                         AVG(v.time_elapsed) as avg_time_elapsed,
+                         COUNT(v.id) as total_visits,
+                         (
+                             SELECT age_group
+                             FROM v
+                             GROUP BY age_group
+                             ORDER BY COUNT(*) DESC
+                             LIMIT 1
+                         ) as most_common_age_group,
+                         (
+                             SELECT gender
+                             FROM v
+                             GROUP BY gender
+                             ORDER BY COUNT(*) DESC
+                             LIMIT 1
+                         ) as most_common_gender
+                     FROM stand
+                     LEFT JOIN v ON 1
+                     GROUP BY stand.id'''
+
+STAND_DATES_QUERY = '''SELECT v.timestamp
+                       FROM visits v
+                       JOIN stands s ON s.id = v.stand_id
+                       WHERE s.name = ?
+                       ORDER BY v.timestamp DESC'''
+
+STAND_DATE_RANGE_QUERY = '''SELECT
+                                MIN(DATE(v.timestamp)) as min_date,
+                                MAX(DATE(v.timestamp)) as max_date
+                            FROM stands s
+                            LEFT JOIN visits v ON v.stand_id = s.id
+                            WHERE s.name = ?
+                            GROUP BY s.id'''
+
+# Stats results keyed by (stand_name, start_date, end_date), TTL matches the dashboard cache
+STATS_CACHE_TTL = 60.0
+STATS_CACHE_SIZE = 1024
+
+# Rarely changing lists (sections, stands, stand names) keyed by their query
+LISTS_CACHE_TTL = 5.0
 
 database = None
+stats_cache: "OrderedDict[Tuple[str, str, str], Tuple[float, dict]]" = OrderedDict()
+stats_cache_lock = threading.Lock()
+# Bumped on every invalidation so a stats read that overlapped a write is not cached
+stats_generations: Dict[str, int] = {}
+lists_cache: Dict[str, Tuple[float, List[dict]]] = {}
+# Bumped on every invalidation so a list read that overlapped a write is not cached
+lists_generations: Dict[str, int] = {}
+lists_cache_lock = threading.Lock()
 
 
 class StandData(BaseModel):
@@ -55,7 +167,7 @@ async def lifespan(app: FastAPI):
     
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     
-    database = Database(INIT_FILE, DB_PATH)
+    database = Database(INIT_SQL, DB_PATH)
     
     try:
         test_result = database.get("SELECT 1 as test")
@@ -72,21 +184,85 @@ async def lifespan(app: FastAPI):
         with open(config_path, "r") as config_file:
             sections.update(json.load(config_file))
 
-    for label, desc in sections.items():
-        database.execute('''INSERT INTO sections (label, description)
-                            VALUES (?, ?)
-                            ON CONFLICT(label) DO NOTHING''', (label, desc["description"]))
+    database.executemany(SECTION_INSERT_QUERY, [(label, desc["description"]) for label, desc in sections.items()])
     
     yield
     
     print("Shutting down database...")
+    database.close()
+
+
+def get_cached_stand_stats(stand_name: str, start_date: str, end_date: str, conn=None) -> Optional[dict]:
+    """Return stand stats for a date range (None for unknown stands), served from a small in-process TTL cache."""
+
+    key = (stand_name, start_date, end_date)
+    now = time.monotonic()
+    with stats_cache_lock:
+        hit = stats_cache.get(key)
+        if hit is not None and now - hit[0] < STATS_CACHE_TTL:
+            stats_cache.move_to_end(key)
+            return hit[1]
+        generation = stats_generations.get(stand_name, 0)
+
+    stats = database.get(STAND_STATS_QUERY, (stand_name, start_date, end_date), conn)
+    if not stats:
+        return None
+    stats = stats[0]
+
+    with stats_cache_lock:
+        # A visit was pushed while querying: the result may predate it, so don't keep it
+        if stats_generations.get(stand_name, 0) != generation:
+            return stats
+        stats_cache[key] = (now, stats)
+        stats_cache.move_to_end(key)
+        while len(stats_cache) > STATS_CACHE_SIZE:
+            stats_cache.popitem(last=False)
+    return stats
+
+
+def invalidate_stand_stats(stand_name: str) -> None:
+    """Drop all cached stats entries of a stand."""
+
+    with stats_cache_lock:
+        stats_generations[stand_name] = stats_generations.get(stand_name, 0) + 1
+        for key in [key for key in stats_cache if key[0] == stand_name]:
+            del stats_cache[key]
+
+
+def get_cached_list(query: str) -> List[dict]:
+    """Return the rows of a parameterless list query, served from a short in-process TTL cache."""
+
+    now = time.monotonic()
+    with lists_cache_lock:
+        hit = lists_cache.get(query)
+        if hit is not None and now - hit[0] < LISTS_CACHE_TTL:
+            return hit[1]
+        generation = lists_generations.get(query, 0)
+
+    rows = database.get(query)
+    with lists_cache_lock:
+        # The list was changed while querying: the rows may predate it, so don't keep them
+        if lists_generations.get(query, 0) != generation:
+            return rows
+        lists_cache[query] = (now, rows)
+    return rows
+
+
+def invalidate_lists(*queries: str) -> None:
+    """Drop the cached rows of the given list queries."""
+
+    with lists_cache_lock:
+        for query in queries:
+            lists_generations[query] = lists_generations.get(query, 0) + 1
+            lists_cache.pop(query, None)
 
 
 app = FastAPI(
     title="Museum Assistant API",
     description="API для управления музеем и посетителями",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 
@@ -118,7 +294,7 @@ def get_sections() -> List[dict]:
     """Return all sections ordered by id."""
 
     global database
-    sections = database.get("SELECT * FROM sections ORDER BY id")
+    sections = get_cached_list(SECTIONS_QUERY)
     return sections
 
 @app.get("/sections/clear")
@@ -126,14 +302,18 @@ def clear_sections() -> None:
     """Remove all sections from the database."""
 
     global database
-    database.truncate_table("sections")
+    try:
+        database.truncate_table("sections")
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=409, detail="Sections can not be cleared while stands still reference them")
+    invalidate_lists(SECTIONS_QUERY)
 
 @app.get("/stands/")
 def get_stands() -> List[dict]:
     """Return all stands ordered by id."""
 
     global database
-    stands = database.get("SELECT * FROM stands ORDER BY id")
+    stands = get_cached_list(STANDS_QUERY)
     return stands
 
 
@@ -142,19 +322,30 @@ def get_stand(stand_id: int) -> dict:
     """Return stand details by numeric id."""
 
     global database
-    result = database.get("SELECT * FROM stands WHERE id = ?", (stand_id,))
+    result = database.get(STAND_BY_ID_QUERY, (stand_id,))
     if result:
         return result[0]
     return {"error": "Stand not found"}
 
 
-@app.get("/visits/")
-def get_visits() -> List[dict]:
-    """Return all visits ordered by timestamp."""
+@app.get("/visits/", response_model=List[dict])
+def get_visits(limit: int = Query(100, ge=1, le=1000, description="Page size"),
+               before: Optional[str] = Query(None, description="Timestamp of the last visit of the previous page"),
+               before_id: Optional[int] = Query(None, description="Id of the last visit of the previous page")) -> ORJSONResponse:
+    """Return one page of visits ordered by timestamp and id descending."""
 
     global database
-    visits = database.get("SELECT * FROM visits ORDER BY timestamp DESC")
-    return visits
+    if (before is None) != (before_id is None):
+        raise HTTPException(status_code=422, detail="before and before_id must be given together")
+
+    # Keyset pagination on (timestamp, id): the index seeks straight to the page instead of
+    # skipping rows, and the id keeps visits sharing the boundary timestamp from being skipped
+    if before is None:
+        visits = database.get(VISITS_QUERY, (limit,))
+    else:
+        visits = database.get(VISITS_BEFORE_QUERY, (before, before_id, limit))
+    # Rows are already plain JSON types: skip response validation and jsonable_encoder
+    return ORJSONResponse(visits)
 
 
 @app.get("/visits/{visit_id}")
@@ -162,34 +353,29 @@ def get_visit(visit_id: int) -> dict:
     """Return visit details by numeric id."""
 
     global database
-    result = database.get("SELECT * FROM visits WHERE id = ?", (visit_id,))
+    result = database.get(VISIT_BY_ID_QUERY, (visit_id,))
     if result:
         return result[0]
     return {"error": "Visit not found"}
 
-@app.get("/api/visits/all")
-def get_all_visits() -> List[dict]:
-    """Return all visits without filters."""
+@app.get("/api/visits/all", response_model=List[dict])
+def get_all_visits(limit: Optional[int] = Query(None, ge=1, description="Page size, all rows if omitted"),
+                   offset: int = Query(0, ge=0, description="Number of rows to skip")) -> ORJSONResponse:
+    """Return visits without filters, optionally one page at a time."""
 
     global database
-    all_visits = database.get('''SELECT * FROM visits
-                                 ORDER BY timestamp DESC''')
-    return all_visits
+    all_visits = database.get(VISITS_PAGE_QUERY, (limit if limit is not None else -1, offset))
+    return ORJSONResponse(all_visits)
 
 @app.get("/api/stands/{stand_name}/date_range")
 def get_dates_range_by_stand(stand_name: str):
     """Return all visit timestamps for a stand."""
 
     global database
-    stand_id = database.get("SELECT id FROM stands WHERE name = ?", (stand_name,))
-    if not stand_id:
+    dates = database.get(STAND_DATE_RANGE_QUERY, (stand_name,))
+    if not dates:
         return []
-    
-    dates = database.get('''SELECT
-                                MIN(DATE(timestamp)) as min_date,
-                                MAX(DATE(timestamp)) as max_date
-                            FROM visits
-                            WHERE stand_id = ?''', (stand_id[0]["id"],))
+
     return dates[0]
 
 @app.get("/api/stands/{stand_name}/dates")
@@ -197,13 +383,9 @@ def get_dates_range_by_stand(stand_name: str):
     """Return all visit timestamps for a stand ordered by time descending."""
     
     global database
-    stand_id = database.get("SELECT id FROM stands WHERE name = ?", (stand_name,))
-    if not stand_id:
-        return []
-
-    dates = database.get("SELECT timestamp FROM visits WHERE stand_id = ? ORDER BY timestamp DESC", (stand_id[0]["id"],))
+    dates = database.get(STAND_DATES_QUERY, (stand_name,))
     
-    return dates
+    return ORJSONResponse(dates)
 
 @app.get("/api/stands/{stand_name}/stats")
 def get_stats_by_stand(stand_name: str,
@@ -212,78 +394,53 @@ def get_stats_by_stand(stand_name: str,
     """Return aggregated visit stats for a stand and date range."""
 
     global database
-    stand_id = database.get("SELECT id FROM stands WHERE name = ?", (stand_name,))
-    if not stand_id:
+    stats = get_cached_stand_stats(stand_name, start_date, end_date)
+    if stats is None:
         return []
 
-    stand_id = stand_id[0]["id"]
-    stats = database.get('''SELECT
-                                AVG(age) as avg_age,
-                                AVG(time_elapsed) as avg_time_elapsed,
-                                COUNT (*) as total_visits,
-                                (
-                                    SELECT age_group 
-                                    FROM visits 
-                                    WHERE stand_id = ? 
-                                    AND DATE(timestamp) BETWEEN ? AND ?
-                                    GROUP BY age_group 
-                                    ORDER BY COUNT(*) DESC 
-                                    LIMIT 1
-                                ) as most_common_age_group,
-                                (
-                                    SELECT gender 
-                                    FROM visits 
-                                    WHERE stand_id = ? 
-                                    AND DATE(timestamp) BETWEEN ? AND ?
-                                    GROUP BY gender 
-                                    ORDER BY COUNT(*) DESC 
-                                    LIMIT 1
-                                ) as most_common_gender
-                            FROM visits
-                            WHERE stand_id = ?
-                                AND DATE(timestamp) BETWEEN ? AND ?''', (stand_id, start_date, end_date,
-                                                                         stand_id, start_date, end_date,
-                                                                         stand_id, start_date, end_date))
-    return stats[0]
+    return stats
+
+@app.get("/api/stands/{stand_name}/bundle")
+def get_stand_bundle(stand_name: str) -> dict:
+    """Return visit timestamps, date range and stats for a stand in one call."""
+
+    global database
+    with database.get_connection(readonly=True) as conn:
+        date_range = database.get(STAND_DATE_RANGE_QUERY, (stand_name,), conn)
+        if not date_range:
+            return {}
+
+        date_range = date_range[0]
+        dates = database.get(STAND_DATES_QUERY, (stand_name,), conn)
+        stats = get_cached_stand_stats(stand_name, date_range["min_date"], date_range["max_date"], conn)
+
+    return {"dates": dates, "date_range": date_range, "stats": stats}
 
 @app.get("/api/stands/names")
 def get_stands_names() -> List[dict]:
     """Return all stand names."""
 
     global database
-    all_names = database.get("SELECT name FROM stands ORDER BY id DESC")
+    all_names = get_cached_list(STAND_NAMES_QUERY)
     return all_names
 
 @app.post("/api/stands/push")
-async def push_stand(data: StandData, request: Request):
+def push_stand(data: StandData, request: Request):
     """Create a new stand linked to a section."""
 
     global database
-    database.execute('''INSERT INTO stands (section_id, name, description)
-                        SELECT
-                            sec.id,
-                            ?,
-                            ?
-                        FROM sections sec
-                        WHERE sec.label = ?''', (data.name, data.description, data.section))
-    print(data)
+    database.execute(STAND_INSERT_QUERY, (data.name, data.description, data.section))
+    invalidate_lists(STANDS_QUERY, STAND_NAMES_QUERY)
+    logging.debug("Stand pushed: %r", data)
 
 @app.post("/api/visits/push")
-async def push_visit(data: VisitData, request: Request):
+def push_visit(data: VisitData, request: Request):
     """Store a new visit for a stand."""
 
     global database
-    database.execute('''INSERT INTO visits (stand_id, gender, age_group, age, timestamp, time_elapsed)
-                        SELECT
-                            stnd.id,
-                            ?,
-                            ?,
-                            ?,
-                            ?,
-                            ?
-                        FROM stands stnd
-                        WHERE stnd.name = ?''', (data.gender, data.age_group, data.age, data.datetime, data.time_elapsed, data.name))
-    print(data)
+    database.execute(VISIT_INSERT_QUERY, (data.gender, data.age_group, data.age, data.datetime, data.time_elapsed, data.name))
+    invalidate_stand_stats(data.name)
+    logging.debug("Visit pushed: %r", data)
 
 
 if __name__ == "__main__":